@@ -23,7 +23,9 @@ import math
 import functools
 import os
 import os.path
+import tempfile
 import numpy as np
+from osgeo import gdal
 
 from delta.config import config
 from delta.imagery import utilities
@@ -131,6 +133,27 @@ def _check_if_files_present(mtl_data, folder, bands_to_use=None):
             return False
     return True
 
+def _convert_to_tiled(path):
+    """Rewrite a stripped or compressed GeoTIFF in place as a tiled, uncompressed one,
+       so later reads do not have to decompress and can be memory mapped."""
+    handle = gdal.Open(path)
+    block_width = handle.GetRasterBand(1).GetBlockSize()[0]
+    tiled = block_width < handle.RasterXSize
+    compressed = 'COMPRESSION' in handle.GetMetadata('IMAGE_STRUCTURE')
+    handle = None
+    if tiled and not compressed:
+        return
+    # unique name, other processes may be converting in the same cache folder
+    (fd, temp_path) = tempfile.mkstemp(suffix='.tif', dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        gdal.Translate(temp_path, path,
+                       creationOptions=['TILED=YES', 'BLOCKXSIZE=256', 'BLOCKYSIZE=256', 'COMPRESS=NONE'])
+        os.replace(temp_path, path)
+    except:
+        os.remove(temp_path)
+        raise
+
 def _find_mtl_file(folder):
     """Returns the path to the MTL file in a folder.
        Returns None if there is no MTL file.
@@ -182,6 +205,10 @@ class LandsatImage(tiff.TiffImage):
         else:
             print('Unpacking tar file ' + paths + ' to folder ' + untar_folder)
             utilities.unpack_to_folder(paths, untar_folder)
+            # convert once here, not every time the image is loaded
+            for p in _get_band_paths(_parse_mtl_file(_find_mtl_file(untar_folder)), untar_folder):
+                if os.path.exists(p):
+                    _convert_to_tiled(p)
 
         bands_to_use = _get_landsat_bands_to_use(self._sensor) if self._bands is None else self._bands
 
@@ -18,6 +18,7 @@
 """
 Block-aligned reading from multiple Geotiff files.
 """
+import itertools
 import os
 import math
 
@@ -31,6 +32,8 @@ from delta.extensions.sources.npy import NumpyImage
 # Suppress GDAL warnings, errors become exceptions so we get them
 gdal.SetConfigOption('CPL_LOG', '/dev/null')
 gdal.UseExceptions()
+# Memory map uncompressed tiffs for reading when possible
+gdal.SetConfigOption('GTIFF_VIRTUAL_MEM_IO', 'IF_ENOUGH_RAM')
 
 _GDAL_TO_NUMPY_TYPES = {
     gdal.GDT_Byte:    np.dtype(np.uint8),
@@ -40,6 +43,8 @@ _GDAL_TO_NUMPY_TYPES = {
     gdal.GDT_Float64: np.dtype(np.float64)
 }
 _NUMPY_TO_GDAL_TYPES = {v: k for k, v in _GDAL_TO_NUMPY_TYPES.items()}
+# Dataset.ReadAsArray accepts band_list starting with GDAL 3.5
+_READ_BAND_LIST = int(gdal.VersionInfo()) >= 3050000
 
 class TiffImage(delta_image.DeltaImage):
     """Images supported by GDAL."""
@@ -141,7 +146,17 @@ class TiffImage(delta_image.DeltaImage):
             if s != (roi.height(), roi.width()):
                 raise IOError('Buffer shape should be (%d, %d) but is (%d, %d)!' %
                               (roi.height(), roi.width(), s[0], s[1]))
-        if bands:
+        if bands and _READ_BAND_LIST:
+            # read consecutive bands from the same file with a single dataset-level call,
+            # so pixel interleaved or compressed data is only decoded once
+            for (h, group) in itertools.groupby(enumerate(bands), key=lambda x: self._band_map[x[1]][0]):
+                group = list(group)
+                start = group[0][0]
+                self._handles[h].ReadAsArray(yoff=roi.min_y, xoff=roi.min_x,
+                                             ysize=roi.height(), xsize=roi.width(),
+                                             buf_obj=buf[start:start + len(group), :, :],
+                                             band_list=[self._band_map[b][1] for (_, b) in group])
+        elif bands:
             for i, b in enumerate(bands):
                 band_handle = self._gdal_band(b)
                 band_handle.ReadAsArray(yoff=roi.min_y, xoff=roi.min_x,
@@ -52,6 +52,9 @@ class ImageSet:
         """
         self._images = images
         self._image_type = image_type
+        self._reader = image_reader(image_type)
+        if self._reader is None:
+            raise ValueError('Unexpected image type %s.' % (image_type))
         self._preprocess = preprocess
         self._nodata_value = nodata_value
 
@@ -105,7 +108,7 @@ class ImageSet:
         `delta.imagery.delta_image.DeltaImage`:
             The image
         """
-        img = image_reader(self.type())(self[index], self.nodata_value())
+        img = self._reader(self[index], self.nodata_value())
         if self._preprocess:
             img.set_preprocess(self._preprocess)
         return img
@@ -127,16 +130,31 @@ __DEFAULT_EXTENSIONS = {'tiff' : '.tiff',
 
 def __extension(conf):
     if conf['extension'] == 'default':
-        return __DEFAULT_EXTENSIONS.get(conf['type'])
+        extension = __DEFAULT_EXTENSIONS.get(conf['type'])
+        if extension is None:
+            raise ValueError('No default extension for image type %s, one must be specified.' % (conf['type']))
+        return extension
     return conf['extension']
 
+def __scan_directory(directory, extension):
+    '''
+    Generator over all files in directory and its subdirectories (following links)
+    ending with extension.
+    '''
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                yield from __scan_directory(entry.path, extension)
+            elif entry.name.endswith(extension):
+                yield entry.path
+
 def __find_images(conf, matching_images=None, matching_conf=None):
     '''
     Find the images specified by a given configuration, returning a list of images.
     If matching_images and matching_conf are specified, we find the labels matching these images.
     '''
     images = []
-    if conf['type'] not in __DEFAULT_EXTENSIONS:
+    if image_reader(conf['type']) is None:
         raise ValueError('Unexpected image type %s.' % (conf['type']))
 
     if conf['files']:
@@ -154,11 +172,7 @@ def __find_images(conf, matching_images=None, matching_conf=None):
         if not os.path.exists(conf['directory']):
             raise ValueError('Supplied images directory %s does not exist.' % (conf['directory']))
         if matching_images is None:
-            for root, _, filenames in os.walk(conf['directory'],
-                                              followlinks=True):
-                for filename in filenames:
-                    if filename.endswith(extension):
-                        images.append(os.path.join(root, filename))
+            images.extend(__scan_directory(conf['directory'], extension))
         else:
             # find matching labels
             for m in matching_images:
@@ -260,8 +274,11 @@ class ImagePreprocessConfig(DeltaConfigComponent):
         Returns
         -------
         Callable:
-            The specified preprocessing function to apply to the image.
+            The specified preprocessing function to apply to the image, or None
+            if no preprocessing is configured.
         """
+        if not self._functions:
+            return None
         prep = lambda data, _, dummy: data
         for (name, args) in self._functions:
             t = preprocess_function(name)
@@ -592,7 +609,7 @@ class IOConfig(DeltaConfigComponent):
         """
         if 'threads' in self._config_dict and self._config_dict['threads']:
             return self._config_dict['threads']
-        return min(1, os.cpu_count() // 2)
+        return max(1, os.cpu_count() // 2)
 
 def register():
     """
@@ -19,6 +19,7 @@
 Tools for loading input images into the TensorFlow Dataset class.
 """
 from concurrent.futures import ThreadPoolExecutor
+import copy
 import functools
 import random
 import threading
@@ -28,6 +29,9 @@ import numpy as np
 from delta.imagery import rectangle
 from delta.config import config
 
+# Largest buffer to read at once when merging rows of tiles, the pipeline holds many of these
+MAX_MERGED_BYTES = 64 * 1024 * 1024
+
 class ImageryDataset: # pylint: disable=too-many-instance-attributes,too-many-arguments
     """
     A dataset for tiling very large imagery for training with tensorflow.
@@ -58,6 +62,9 @@ class ImageryDataset: # pylint: disable=too-many-instance-attributes,too-many-ar
         """
 
         self._iopool = ThreadPoolExecutor(config.io.threads())
+        self._tile_cache = None
+        self._tile_cache_lock = threading.Lock()
+        self._image_types = (set(), set()) # data types of the images and labels, found when listing tiles
 
         # Record some of the config values
         self.set_chunk_output_shapes(chunk_shape, output_shape)
@@ -84,7 +91,7 @@ class ImageryDataset: # pylint: disable=too-many-instance-attributes,too-many-ar
         self._num_bands = images.load(0).num_bands()
         self._random_seed = random.randint(0, 1 << 16)
 
-    def _list_tiles(self, i): # pragma: no cover
+    def _list_tiles(self, i):
         """
         Parameters
         ----------
@@ -97,9 +104,11 @@ class ImageryDataset: # pylint: disable=too-many-instance-attributes,too-many-ar
             List of tiles to read from the given image
         """
         img = self._images.load(i)
+        self._image_types[0].add(img.dtype())
 
         if self._labels: # If we have labels make sure they are the same size as the input images
             label = self._labels.load(i)
+            self._image_types[1].add(label.dtype())
             if label.size() != img.size():
                 raise AssertionError('Label file ' + self._labels[i] + ' with size ' + str(label.size())
                                      + ' does not match input image ' + self._images[i] + ' size of ' + str(img.size()))
@@ -107,15 +116,92 @@ class ImageryDataset: # pylint: disable=too-many-instance-attributes,too-many-ar
         if self._chunk_shape:
             assert tile_shape[0] >= self._chunk_shape[0] and \
                    tile_shape[1] >= self._chunk_shape[1], 'Tile too small.'
-            return img.tiles((tile_shape[0], tile_shape[1]), min_shape=self._chunk_shape,
-                             overlap_shape=self._tile_overlap,
-                             by_block=True)
-        return img.tiles((tile_shape[0], tile_shape[1]), partials=False, partials_overlap=True,
-                         overlap_shape=self._tile_overlap, by_block=True)
+            blocks = img.tiles((tile_shape[0], tile_shape[1]), min_shape=self._chunk_shape,
+                               overlap_shape=self._tile_overlap,
+                               by_block=True)
+        else:
+            blocks = img.tiles((tile_shape[0], tile_shape[1]), partials=False, partials_overlap=True,
+                               overlap_shape=self._tile_overlap, by_block=True)
+        # buffers are held after preprocessing, which may convert them to the dataset type
+        item_size = max(np.dtype(img.dtype()).itemsize, self._data_type.size)
+        row_bytes = img.width() * img.num_bands() * item_size
+        return self._merge_disk_blocks(blocks, img.block_size()[0], MAX_MERGED_BYTES // row_bytes)
+
+    @staticmethod
+    def _merge_disk_blocks(blocks, block_height, max_height):
+        """
+        Merge consecutive rows of tiles that end in the same row of blocks on disk
+        as the previous row, so each disk block is decoded once instead of once per
+        row of tiles. A row reaching into a new row of disk blocks starts a new merged
+        rectangle, so overlapping rows do not chain through the whole image.
+
+        Parameters
+        ----------
+        blocks: List[Tuple[Rectangle, List[Rectangle]]]
+            Rows of tiles as returned by `DeltaImage.tiles` with `by_block`.
+        block_height: int
+            Height of the blocks the image is stored in on disk.
+        max_height: int
+            Largest height of a merged rectangle, to bound memory use.
+
+        Returns
+        -------
+        List[Tuple[Rectangle, List[Rectangle]]]:
+            The merged rows, with tiles relative to the merged rectangles.
+        """
+        result = []
+        for (rect, tiles) in blocks:
+            if result:
+                (prev, prev_tiles) = result[-1]
+                merged = copy.copy(prev)
+                merged.expand_to_contain_rect(rect)
+                if rect.height() < block_height and \
+                   (rect.max_y - 1) // block_height == (prev.max_y - 1) // block_height and \
+                   merged.height() <= max_height:
+                    dx = merged.min_x - prev.min_x
+                    dy = merged.min_y - prev.min_y
+                    shifted = []
+                    for t in prev_tiles:
+                        t = copy.copy(t)
+                        t.shift(-dx, -dy)
+                        shifted.append(t)
+                    for t in tiles:
+                        t = copy.copy(t)
+                        t.shift(rect.min_x - merged.min_x, rect.min_y - merged.min_y)
+                        shifted.append(t)
+                    result[-1] = (merged, shifted)
+                    continue
+            result.append((rect, tiles))
+        return result
+
+    def _tiles(self, i):
+        """
+        Same as `_list_tiles`, but the tiles for all images are only computed once
+        and reused every epoch. Do not modify the returned list.
+
+        Returns
+        -------
+        List[(Rectangle, numpy.ndarray)]:
+            List of blocks to read, with an Nx4 int32 array of the tiles in each block.
+            Rows are [min_y, min_x, height, width] relative to the block.
+        """
+        # called from the image and label generators at the same time, only publish the complete list
+        with self._tile_cache_lock:
+            if self._tile_cache is None:
+                tile_cache = []
+                for j in range(len(self._images)):
+                    blocks = []
+                    for (rect, sub_tiles) in self._list_tiles(j):
+                        rois = np.array([(s.min_y, s.min_x, s.height(), s.width()) for s in sub_tiles],
+                                        dtype=np.int32)
+                        blocks.append((rect, rois.reshape((-1, 4))))
+                    tile_cache.append(blocks)
+                self._tile_cache = tile_cache
+            return self._tile_cache[i]
 
     def _tile_generator(self, is_labels): # pragma: no cover
         """
-        A generator that yields image tiles over all images.
+        A generator that yields blocks read from all images, with the tiles in each block.
 
         Parameters
         ----------
@@ -124,8 +210,9 @@ class ImageryDataset: # pylint: disable=too-many-instance-attributes,too-many-ar
 
         Returns
         -------
-        Iterator[numpy.ndarray]:
-            Iterator over iamge tiles.
+        Iterator[(numpy.ndarray, numpy.ndarray)]:
+            Iterator over image blocks and an Nx4 array of the tiles in each block,
+            with rows [min_y, min_x, height, width].
         """
         # track epoch (must be same for label and non-label)
         epoch = self._epoch[1 if is_labels else 0]
@@ -145,7 +232,8 @@ class ImageryDataset: # pylint: disable=too-many-instance-attributes,too-many-ar
         # generator that creates tiles in a random order, but consistent between images and labels
         # returns generator of (img, tile_list) tuples
         def tile_gen():
-            image_tiles = [(images[i], self._list_tiles(i)) for i in range(len(images))]
+            # copy the cached lists since they are shared between images and labels
+            image_tiles = [(images[i], list(self._tiles(i))) for i in range(len(images))]
             # shuffle tiles within each image
             for (img, tiles) in image_tiles:
                 rand.shuffle(tiles)
@@ -188,9 +276,9 @@ class ImageryDataset: # pylint: disable=too-many-instance-attributes,too-many-ar
 
         # add a buffer to read to the multiprocessing queue
         def add_to_queue(buf_queue, item):
-            (img, (rect, sub_tiles)) = item
+            (img, (rect, rois)) = item
             buf = self._iopool.submit(lambda: read_image(img, rect))
-            buf_queue.append((rect, sub_tiles, buf))
+            buf_queue.append((rect, rois, buf))
 
         gen = tile_gen()
         buf_queue = []
@@ -200,27 +288,24 @@ class ImageryDataset: # pylint: disable=too-many-instance-attributes,too-many-ar
             except StopIteration:
                 break
             add_to_queue(buf_queue, next_item)
-        # process buffers and yield sub tiles. For efficiency, we just
-        # return an entire buffer's sub tiles at once, so not fully random
-        cur_bufs = []
-        while buf_queue or cur_bufs:
-            while len(cur_bufs) < config.io.interleave_blocks() and buf_queue:
-                (_, sub_tiles, buf) = buf_queue.pop(0)
-                cur_bufs.append((sub_tiles, buf.result()))
-                try:
-                    add_to_queue(buf_queue, next(gen))
-                except StopIteration:
-                    pass
-            while True:
-                buf_index = rand.randrange(len(cur_bufs))
-                (sub_tiles, buf) = cur_bufs[buf_index]
-                if not sub_tiles:
-                    del cur_bufs[buf_index]
-                    break
-                sub_index = rand.randrange(len(sub_tiles))
-                s = sub_tiles[sub_index]
-                del sub_tiles[sub_index]
-                yield buf[s.min_y:s.max_y, s.min_x:s.max_x, :]
+        # yield each buffer along with its sub tiles as [min_y, min_x, height, width] rows.
+        # The sub tiles are cut out and interleaved in the tensorflow graph.
+        while buf_queue:
+            (_, rois, buf) = buf_queue.pop(0)
+            buf = buf.result()
+            try:
+                add_to_queue(buf_queue, next(gen))
+            except StopIteration:
+                pass
+            order = list(range(rois.shape[0]))
+            rand.shuffle(order)
+            yield (buf, rois[order])
+
+    @staticmethod
+    def _split_tiles(buf, rois):
+        """Split a buffer read from disk into a dataset of its sub tiles."""
+        return tf.data.Dataset.from_tensor_slices(rois).map(
+            lambda r: buf[r[0]:r[0] + r[2], r[1]:r[1] + r[3], :])
 
     def _load_images(self, is_labels, data_type):
         """
@@ -239,10 +324,28 @@ class ImageryDataset: # pylint: disable=too-many-instance-attributes,too-many-ar
             Dataset of image tiles
         """
         self._epoch[1 if is_labels else 0] = 0 # count epochs for random
-        return tf.data.Dataset.from_generator(functools.partial(self._tile_generator,
-                                                                is_labels=is_labels),
-                                              output_types=data_type,
-                                              output_shapes=tf.TensorShape((None, None, None)))
+        # without preprocessing, pass tiles out of python in the images' own (usually
+        # smaller integer) type and cast them in the graph
+        imageset = self._labels if is_labels else self._images
+        read_type = data_type
+        if imageset.preprocess() is None:
+            # list the tiles now, when the dataset is built rather than lazily in the
+            # generator, since listing them loads every image once and records its type
+            self._tiles(0)
+            types = self._image_types[1 if is_labels else 0]
+            if len(types) == 1:
+                read_type = tf.as_dtype(next(iter(types)))
+        ds = tf.data.Dataset.from_generator(functools.partial(self._tile_generator,
+                                                              is_labels=is_labels),
+                                            output_types=(read_type, tf.int32),
+                                            output_shapes=(tf.TensorShape((None, None, None)),
+                                                           tf.TensorShape((None, 4))))
+        # order must be deterministic so images and labels stay matched
+        ds = ds.interleave(self._split_tiles, cycle_length=config.io.interleave_blocks(),
+                           num_parallel_calls=tf.data.experimental.AUTOTUNE)
+        if read_type != data_type:
+            ds = ds.map(lambda x: tf.cast(x, data_type), num_parallel_calls=tf.data.experimental.AUTOTUNE)
+        return ds
 
     def _chunk_image(self, image): # pragma: no cover
         """Split up a tensor image into tensor chunks"""
@@ -278,6 +381,13 @@ class ImageryDataset: # pylint: disable=too-many-instance-attributes,too-many-ar
         result = tf.reshape(labels, [-1, self._output_shape[0], self._output_shape[1], 1])
         return result
 
+    @staticmethod
+    def _drop_nodata_chunks(chunks, labels, nodata_value): # pragma: no cover
+        """Remove all chunks from a tile where the labels are entirely nodata."""
+        valid = tf.math.not_equal(tf.reshape(labels, [tf.shape(labels)[0], -1]), nodata_value)
+        valid = tf.math.reduce_any(valid, axis=1)
+        return (tf.boolean_mask(chunks, valid), tf.boolean_mask(labels, valid))
+
     def data(self):
         """
         Returns
@@ -305,7 +415,7 @@ class ImageryDataset: # pylint: disable=too-many-instance-attributes,too-many-ar
                 return label_set.unbatch()
         return label_set
 
-    def dataset(self, class_weights=None, augment_function=None):
+    def dataset(self, class_weights=None, augment_function=None, cache_path=None):
         """
         Returns a tensorflow dataset as configured by the class.
 
@@ -315,6 +425,10 @@ class ImageryDataset: # pylint: disable=too-many-instance-attributes,too-many-ar
             list of weights for the classes.
         augment_function: Callable[[Tensor, Tensor], (Tensor, Tensor)]
             Function to be applied to the image and label before use.
+        cache_path: str
+            If specified, cache the loaded tiles to this file the first time through the
+            dataset. Later epochs read from the cache, in the same order. Tiles are cached
+            before they are split into chunks, and augmentation is still applied each epoch.
 
         Returns
         -------
@@ -322,20 +436,44 @@ class ImageryDataset: # pylint: disable=too-many-instance-attributes,too-many-ar
             With (data, labels, optionally weights)
         """
 
-        # Pair the data and labels in our dataset
-        ds = tf.data.Dataset.zip((self.data(), self.labels()))
         # ignore chunks which are all nodata (nodata is re-indexed to be after the classes)
         # cannot do with max_rand_offset since would have different number of tiles which
         # breaks keras fit
-        if self._labels.nodata_value() is not None:
-            ds = ds.filter(lambda x, y: tf.math.reduce_any(tf.math.not_equal(y, self._labels.nodata_value())))
+        nodata_value = self._labels.nodata_value()
+        if cache_path is not None and self._max_rand_offset:
+            raise ValueError('Caching is not supported with max_rand_offset.')
+        if self._chunk_shape:
+            # Pair the data and labels a tile at a time, so nodata chunks are removed with
+            # one vectorized check per tile rather than a filter on every chunk
+            ds = tf.data.Dataset.zip((self._load_images(False, self._data_type),
+                                      self._load_images(True, self._label_type)))
+            if nodata_value is not None:
+                # skip tiles with no labels at all before splitting them into chunks
+                ds = ds.filter(lambda x, y: tf.math.reduce_any(tf.math.not_equal(y, nodata_value)))
+            # cache whole tiles, chunks overlap and would take many times the space
+            if cache_path is not None:
+                ds = ds.cache(cache_path)
+            # data and labels are paired now, so the order of later steps need not be kept
+            ds = ds.map(lambda x, y: (self._chunk_image(x), self._reshape_labels(y)),
+                        num_parallel_calls=tf.data.experimental.AUTOTUNE, deterministic=False)
+            if nodata_value is not None:
+                ds = ds.map(lambda x, y: self._drop_nodata_chunks(x, y, nodata_value),
+                            num_parallel_calls=tf.data.experimental.AUTOTUNE, deterministic=False)
+            ds = ds.unbatch()
+        else:
+            ds = tf.data.Dataset.zip((self.data(), self.labels()))
+            if nodata_value is not None:
+                ds = ds.filter(lambda x, y: tf.math.reduce_any(tf.math.not_equal(y, nodata_value)))
+            if cache_path is not None:
+                ds = ds.cache(cache_path)
         if augment_function is not None:
-            ds = ds.map(augment_function, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+            ds = ds.map(augment_function, num_parallel_calls=tf.data.experimental.AUTOTUNE,
+                        deterministic=False)
         if class_weights is not None:
             class_weights.append(0.0)
             lookup = tf.constant(class_weights)
             ds = ds.map(lambda x, y: (x, y, tf.gather(lookup, tf.cast(y, tf.int32), axis=None)),
-                        num_parallel_calls=config.io.threads())
+                        num_parallel_calls=tf.data.experimental.AUTOTUNE, deterministic=False)
         return ds
 
     def num_bands(self):
@@ -368,6 +506,7 @@ class ImageryDataset: # pylint: disable=too-many-instance-attributes,too-many-ar
                 output_shape = output_shape[0:2]
         self._chunk_shape = chunk_shape
         self._output_shape = output_shape
+        self._tile_cache = None
 
     def chunk_shape(self):
         """
@@ -426,6 +565,7 @@ class ImageryDataset: # pylint: disable=too-many-instance-attributes,too-many-ar
         tile_shape: (int, int)
             New tile shape"""
         self._tile_shape = tile_shape
+        self._tile_cache = None
 
     def tile_shape(self):
         """
@@ -471,5 +611,12 @@ class AutoencoderDataset(ImageryDataset):
     def labels(self):
         return self.data()
 
-    def dataset(self, class_weights=None, augment_function=None):
-        return self.data().map(lambda x: (x, x))
+    def dataset(self, class_weights=None, augment_function=None, cache_path=None):
+        if cache_path is not None and self._max_rand_offset:
+            raise ValueError('Caching is not supported with max_rand_offset.')
+        ds = self._load_images(False, self._data_type)
+        if cache_path is not None:
+            ds = ds.cache(cache_path)
+        if self._chunk_shape:
+            ds = ds.map(self._chunk_image, num_parallel_calls=tf.data.experimental.AUTOTUNE).unbatch()
+        return ds.map(lambda x: (x, x))
@@ -150,6 +150,9 @@ def _make_model(layer_list):
         prev_layer = last.name
 
     outputs = last.output_tensor()
+    # with a mixed precision policy, output float32 so the loss is computed stably
+    if outputs.dtype in (tensorflow.float16, tensorflow.bfloat16):
+        outputs = tensorflow.keras.layers.Activation('linear', dtype='float32')(outputs)
     inputs = [l.output_tensor() for l in all_layers.values() if l.is_input()]
 
     if len(inputs) == 1:
@@ -60,7 +60,8 @@ class TrainingSpec:#pylint:disable=too-few-public-methods,too-many-arguments
     Options used in training by `delta.ml.train.train`.
     """
     def __init__(self, batch_size, epochs, loss, metrics, validation=None, steps=None,
-                 stride=None, optimizer='Adam', max_tile_offset=None):
+                 stride=None, optimizer='Adam', max_tile_offset=None, cache_dataset=False,
+                 cache_dir=None):
         self.batch_size = batch_size
         self.epochs = epochs
         self.loss = loss
@@ -70,6 +71,8 @@ class TrainingSpec:#pylint:disable=too-few-public-methods,too-many-arguments
         self.stride = stride
         self.optimizer = optimizer
         self.max_tile_offset = max_tile_offset
+        self.cache_dataset = cache_dataset
+        self.cache_dir = cache_dir
 
 class NetworkConfig(config.DeltaConfigComponent):
     """
@@ -175,6 +178,10 @@ class TrainingConfig(config.DeltaConfigComponent):
                             'Features to group into each training batch.')
         self.register_field('max_tile_offset', int, None, None,
                             'Choose random tile offset each epoch within this range.')
+        self.register_field('cache_dataset', bool, None, None,
+                            'Cache the loaded training data on disk after the first epoch.')
+        self.register_field('cache_dir', str, None, config.validate_path,
+                            'Directory for the training data cache, the system temporary directory if not set.')
         self.register_field('loss', (str, dict), None, None, 'Keras loss function.')
         self.register_field('metrics', list, None, None, 'List of metrics to apply.')
         self.register_field('steps', int, None, config.validate_non_negative, 'Batches to train per epoch.')
@@ -199,6 +206,8 @@ class TrainingConfig(config.DeltaConfigComponent):
         Returns the options configuring training.
         """
         if not self.__training:
+            if self._config_dict['cache_dataset'] and self._config_dict['max_tile_offset']:
+                raise ValueError('cache_dataset is not supported with max_tile_offset.')
             from_training = self._components['validation'].from_training()
             vsteps = self._components['validation'].steps()
             (vimg, vlabels) = (None, None)
@@ -213,7 +222,9 @@ class TrainingConfig(config.DeltaConfigComponent):
                                            steps=self._config_dict['steps'],
                                            stride=self._config_dict['stride'],
                                            optimizer=self._config_dict['optimizer'],
-                                           max_tile_offset=self._config_dict['max_tile_offset'])
+                                           max_tile_offset=self._config_dict['max_tile_offset'],
+                                           cache_dataset=self._config_dict['cache_dataset'],
+                                           cache_dir=self._config_dict['cache_dir'])
         return self.__training
 
     def augmentations(self):
@@ -179,11 +179,13 @@ class Predictor(ABC):
         for i in range(0, chunks.shape[0], BATCH_SIZE):
             best[i:i+BATCH_SIZE] = self._model.predict_on_batch(chunks[i:i+BATCH_SIZE])
 
+        # chunks are in row major order from extract_patches, stitch them back together at once
         retval = np.zeros(out_shape + (net_output_shape[-1],))
-        for chunk_idx in range(0, best.shape[0]):
-            r = (chunk_idx // (  out_shape[1] // net_output_shape[1])) * net_output_shape[0]
-            c = (chunk_idx  % ( out_shape[1] // net_output_shape[1])) * net_output_shape[1]
-            retval[r:r+net_output_shape[0],c:c+net_output_shape[1],:] = best[chunk_idx,:,:,:]
+        rows = out_shape[0] // net_output_shape[0]
+        cols = out_shape[1] // net_output_shape[1]
+        best = best.reshape((rows, cols) + net_output_shape).swapaxes(1, 2)
+        retval[:rows * net_output_shape[0], :cols * net_output_shape[1], :] = \
+                best.reshape((rows * net_output_shape[0], cols * net_output_shape[1], net_output_shape[-1]))
 
         if image_nodata_value is not None:
             ox = (data.shape[1] - out_shape[1]) // 2
@@ -83,16 +83,18 @@ def _strategy(devices):
         strategy = tf.distribute.MirroredStrategy(devices=devices)
     return strategy
 
-def _prep_datasets(ids, tc):
+def _prep_datasets(ids, tc, cache_path=None):
     if tc.max_tile_offset:
         # with filtering nodata, number of tiles changes
         assert tc.steps, 'max_tile_offset only supported with steps set.'
-    ds = ids.dataset(config.dataset.classes.weights(), config_augmentation())
+    ds = ids.dataset(config.dataset.classes.weights(), config_augmentation(), cache_path)
 
     validation=None
     if tc.validation:
         if tc.validation.from_training:
-            validation = ds.take(tc.validation.steps)
+            # the cache can only be written by one iterator at a time, so validate on an uncached copy
+            vds = ids.dataset(config.dataset.classes.weights(), config_augmentation()) if cache_path else ds
+            validation = vds.take(tc.validation.steps)
             ds = ds.skip(tc.validation.steps)
         else:
             vimg   = tc.validation.images
@@ -110,31 +112,37 @@ def _prep_datasets(ids, tc):
                 validation = vimagery.dataset(config.dataset.classes.weights())
         if validation:
             validation = validation.batch(tc.batch_size, drop_remainder=True)
+            validation = validation.prefetch(tf.data.experimental.AUTOTUNE)
     else:
         validation = None
 
+    # prefetch after batching so the next batch is prepared while the current one trains
     ds = ds.batch(tc.batch_size, drop_remainder=True)
+    ds = ds.prefetch(tf.data.experimental.AUTOTUNE)
     return (ds, validation)
 
 def _log_mlflow_params(model, dataset, training_spec):
     images = dataset.image_set()
     #labels = dataset.label_set()
-    mlflow.log_param('Images - Type',   images.type())
-    mlflow.log_param('Images - Count',   len(images))
-    mlflow.log_param('Images - Stride', training_spec.stride)
-    mlflow.log_param('Images - Tile Size', len(model.layers))
-    mlflow.log_param('Train - Steps', training_spec.steps)
-    mlflow.log_param('Train - Loss Function', training_spec.loss)
-    mlflow.log_param('Train - Epochs', training_spec.epochs)
-    mlflow.log_param('Train - Batch Size', training_spec.batch_size)
-    mlflow.log_param('Train - Optimizer', training_spec.optimizer)
-    mlflow.log_param('Model - Layers', len(model.layers))
-    mlflow.log_param('Model - Parameters - Non-Trainable',
-                     np.sum([K.count_params(w) for w in model.non_trainable_weights]))
-    mlflow.log_param('Model - Parameters - Trainable',
-                     np.sum([K.count_params(w) for w in model.trainable_weights]))
-    mlflow.log_param('Model - Shape - Output',   dataset.output_shape())
-    mlflow.log_param('Model - Shape - Input',   dataset.input_shape())
+    # send all parameters in a single batched request
+    mlflow.log_params({
+        'Images - Type':   images.type(),
+        'Images - Count':   len(images),
+        'Images - Stride': training_spec.stride,
+        'Images - Tile Size': len(model.layers),
+        'Train - Steps': training_spec.steps,
+        'Train - Loss Function': training_spec.loss,
+        'Train - Epochs': training_spec.epochs,
+        'Train - Batch Size': training_spec.batch_size,
+        'Train - Optimizer': training_spec.optimizer,
+        'Model - Layers': len(model.layers),
+        'Model - Parameters - Non-Trainable':
+            np.sum([K.count_params(w) for w in model.non_trainable_weights]),
+        'Model - Parameters - Trainable':
+            np.sum([K.count_params(w) for w in model.trainable_weights]),
+        'Model - Shape - Output':   dataset.output_shape(),
+        'Model - Shape - Input':   dataset.input_shape()
+    })
     #mlflow.log_param('Status', 'Running') Illegal to change the value!
 
 class _MLFlowCallback(tf.keras.callbacks.Callback):
@@ -150,11 +158,14 @@ class _MLFlowCallback(tf.keras.callbacks.Callback):
 
     def on_epoch_end(self, epoch, logs=None):
         self.epoch = epoch
+        # log all metrics in a single batched request
+        metrics = {}
         for k in logs.keys():
             if k.startswith('val_'):
-                mlflow.log_metric('Validation ' + k[4:], logs[k], epoch)
+                metrics['Validation ' + k[4:]] = logs[k]
             else:
-                mlflow.log_metric('Epoch ' + k, logs[k], epoch)
+                metrics['Epoch ' + k] = logs[k]
+        mlflow.log_metrics(metrics, step=epoch)
         if config.mlflow.checkpoints.frequency() and epoch > 0 and epoch % config.mlflow.checkpoints.frequency() == 0:
             filename = os.path.join(self.temp_dir, '%d%s' % (epoch, self.model_extension))
             save_model(self.model, filename)
@@ -171,10 +182,7 @@ class _MLFlowCallback(tf.keras.callbacks.Callback):
     def on_train_batch_end(self, batch, logs=None):
         self.batch = batch
         if batch > 0 and batch % config.mlflow.frequency() == 0:
-            for k in logs.keys():
-                if k in ('batch', 'size'):
-                    continue
-                mlflow.log_metric(k, logs[k], step=batch)
+            mlflow.log_metrics({k: v for (k, v) in logs.items() if k not in ('batch', 'size')}, step=batch)
 
 def _mlflow_train_setup(model, dataset, training_spec, model_extension):
     mlflow.set_tracking_uri(config.mlflow.uri())
@@ -328,6 +336,8 @@ def train(model_fn, dataset : ImageryDataset, training_spec, resume_path=None, i
     (tensorflow.keras.models.Model, History):
         The trained model and the training history.
     """
+    if training_spec.cache_dataset and training_spec.max_tile_offset:
+        raise ValueError('cache_dataset is not supported with max_tile_offset.')
     model = compile_model(model_fn, training_spec, resume_path)
     assert model.input_shape[3] == dataset.num_bands(), 'Number of bands in model does not match data.'
     # last element differs for the sparse metrics
@@ -335,11 +345,14 @@ def train(model_fn, dataset : ImageryDataset, training_spec, resume_path=None, i
             'Network output shape %s does not match label shape %s.' % \
             (model.output_shape[1:], dataset.output_shape()[:-1])
 
-    (ds, validation) = _prep_datasets(dataset, training_spec)
-
     (callbacks, mcb) = _build_callbacks(model, dataset, training_spec, internal_model_extension)
 
+    cache_dir = None
     try:
+        if training_spec.cache_dataset:
+            cache_dir = tempfile.mkdtemp(dir=training_spec.cache_dir)
+        (ds, validation) = _prep_datasets(dataset, training_spec,
+                                          os.path.join(cache_dir, 'train') if cache_dir else None)
 
         if (training_spec.steps is None) or (training_spec.steps > 0):
             if training_spec.steps is not None:
@@ -383,9 +396,7 @@ def train(model_fn, dataset : ImageryDataset, training_spec, resume_path=None, i
             mlflow.log_param('Status', 'Completed')
     except:
         if config.mlflow.enabled():
-            mlflow.log_param('Status', 'Aborted')
-            mlflow.log_param('Epoch', mcb.epoch)
-            mlflow.log_param('Batch', mcb.batch)
+            mlflow.log_params({'Status': 'Aborted', 'Epoch': mcb.epoch, 'Batch': mcb.batch})
             mlflow.end_run('FAILED')
             model_path = os.path.join(mcb.temp_dir, 'aborted_model' + internal_model_extension)
             print('\nAborting, saving current model to %s.'
@@ -398,6 +409,8 @@ def train(model_fn, dataset : ImageryDataset, training_spec, resume_path=None, i
                 os.remove(model_path)
         raise
     finally:
+        if cache_dir:
+            shutil.rmtree(cache_dir)
         if config.mlflow.enabled():
             if mcb and mcb.temp_dir:
                 shutil.rmtree(mcb.temp_dir)
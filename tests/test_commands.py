@@ -243,3 +243,14 @@ def test_predict_image(doubling_tiff_filenames):
     image = TiffImage(doubling_tiff_filenames[0])
     label = TiffImage(doubling_tiff_filenames[1])
     pred.predict(image, label)
+
+def test_predict_array_chunks():
+    # non-square chunks in a grid with several rows and columns, so misplaced chunks are caught
+    inputs = tf.keras.layers.Input((6, 8, 1))
+    output = tf.keras.layers.Cropping2D((2, 2))(inputs)
+    model = tf.keras.Model(inputs, output)
+    pred = ImagePredictor(model)
+    data = np.arange(14 * 20, dtype=np.float32).reshape((14, 20, 1))
+    result = pred._predict_array(data, None) # pylint: disable=protected-access
+    assert result.shape == (10, 16, 1)
+    assert np.array_equal(result, data[2:-2, 2:-2, :])
@@ -27,6 +27,9 @@ import tensorflow as tf
 from conftest import config_reset
 
 from delta.config import config
+from delta.config.extensions import register_image_reader
+from delta.extensions.sources.tiff import TiffImage
+from delta.imagery.imagery_config import ImageSet
 from delta.ml import config_parser
 
 def test_general():
@@ -72,6 +75,30 @@ def test_images_dir():
     assert len(im) == 1
     assert im[0].endswith('landsat.tiff') and os.path.exists(im[0])
 
+def test_images_dir_nested(tmp_path):
+    config_reset()
+    image_dir = tmp_path / 'images'
+    (image_dir / 'a' / 'b').mkdir(parents=True)
+    other_dir = tmp_path / 'other'
+    other_dir.mkdir()
+    (image_dir / 'top.tiff').touch()
+    (image_dir / 'a' / 'b' / 'nested.tiff').touch()
+    (image_dir / 'a' / 'ignored.txt').touch()
+    (other_dir / 'linked.tiff').touch()
+    os.symlink(str(other_dir), str(image_dir / 'link'))
+    test_str = '''
+    dataset:
+      images:
+        type: tiff
+        preprocess: ~
+        directory: %s
+        extension: .tiff
+    ''' % (image_dir)
+    config.load(yaml_str=test_str)
+    im = config.dataset.images()
+    assert sorted(os.path.relpath(i, str(image_dir)) for i in im) == \
+           sorted(['top.tiff', os.path.join('a', 'b', 'nested.tiff'), os.path.join('link', 'linked.tiff')])
+
 def test_preprocess():
     config_reset()
     test_str = '''
@@ -108,6 +135,41 @@ def test_images_files():
     assert len(im) == 1
     assert im[0] == file_path
 
+def test_images_bad_type():
+    config_reset()
+    file_path = os.path.join(os.path.dirname(__file__), 'data', 'landsat.tiff')
+    with pytest.raises(ValueError):
+        ImageSet([file_path], 'garbage')
+    test_str = '''
+    dataset:
+      images:
+        type: garbage
+        preprocess: ~
+        files: [%s]
+    ''' % (file_path)
+    config.load(yaml_str=test_str)
+    with pytest.raises(ValueError):
+        config.dataset.images()
+
+def test_images_no_default_extension():
+    config_reset()
+    register_image_reader('test_no_extension', TiffImage)
+    dir_path = os.path.join(os.path.dirname(__file__), 'data')
+    test_str = '''
+    dataset:
+      images:
+        type: test_no_extension
+        preprocess: ~
+        directory: %s/
+        extension: %s
+    '''
+    config.load(yaml_str=test_str % (dir_path, 'default'))
+    with pytest.raises(ValueError):
+        config.dataset.images()
+    config_reset()
+    config.load(yaml_str=test_str % (dir_path, '.tiff'))
+    assert len(config.dataset.images()) == 1
+
 def test_classes():
     config_reset()
     test_str = '''
@@ -201,6 +263,23 @@ def test_model_from_dict():
     assert model.output_shape[1] == output_shape
     assert len(model.layers) == 4 # Input layer is added behind the scenes
 
+def test_model_mixed_precision():
+    config_reset()
+    test_str = '''
+    layers:
+    - Input:
+        shape: [17, 17, 8]
+    - Conv2D:
+        filters: 3
+        kernel_size: [3, 3]
+    '''
+    tf.keras.mixed_precision.set_global_policy('mixed_float16')
+    try:
+        model = config_parser.model_from_dict(yaml.safe_load(test_str), {})()
+        assert model.output.dtype == tf.float32
+    finally:
+        tf.keras.mixed_precision.set_global_policy('float32')
+
 def test_pretrained_layer():
     config_reset()
     base_model = '''
@@ -365,6 +444,8 @@ def test_train():
       loss: SparseCategoricalCrossentropy
       metrics: [metric]
       optimizer: opt
+      cache_dataset: true
+      cache_dir: /tmp/delta_cache
       validation:
         steps: 20
         from_training: true
@@ -378,9 +459,23 @@ def test_train():
     assert isinstance(config_parser.loss_from_dict(tc.loss), tf.keras.losses.SparseCategoricalCrossentropy)
     assert tc.metrics == ['metric']
     assert tc.optimizer == 'opt'
+    assert tc.cache_dataset
+    assert tc.cache_dir == '/tmp/delta_cache'
     assert tc.validation.steps == 20
     assert tc.validation.from_training
 
+def test_train_cache_offset():
+    config_reset()
+    test_str = '''
+    train:
+      steps: 10
+      max_tile_offset: 5
+      cache_dataset: true
+    '''
+    config.load(yaml_str=test_str)
+    with pytest.raises(ValueError):
+        config.train.spec()
+
 def test_optimizer():
     config_reset()
     test_str = '''
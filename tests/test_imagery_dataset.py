@@ -20,11 +20,14 @@ import os
 
 import pytest
 import numpy as np
+import tensorflow as tf
 
 import conftest
 
 from delta.config import config
+from delta.extensions.sources import tiff
 from delta.imagery import imagery_dataset, rectangle
+from delta.imagery.imagery_config import ImageSet
 
 def test_basics(dataset_block_label):
     """
@@ -113,6 +116,40 @@ def test_class_weights(dataset_block_label):
     for (_, label, weights) in ds.take(100):
         assert np.all(lookup[label.numpy()] == weights)
 
+def test_cache(dataset_block_label, tmp_path):
+    """
+    Tests that a cached dataset gives the same chunks from the cache as from the images.
+    """
+    cache_path = str(tmp_path / 'cache')
+    ds = dataset_block_label.dataset(cache_path=cache_path)
+    first = [(image.numpy(), label.numpy()) for (image, label) in ds]
+    assert os.listdir(str(tmp_path))
+    check_blocks(ds.take(100))
+    second = [(image.numpy(), label.numpy()) for (image, label) in ds]
+    assert len(first) == len(second)
+    assert np.sum([np.sum(i) for (i, _) in first]) == np.sum([np.sum(i) for (i, _) in second])
+    assert np.sum([np.sum(l) for (_, l) in first]) == np.sum([np.sum(l) for (_, l) in second])
+
+def test_native_type(tmp_path):
+    """
+    Tests that images without preprocessing are read in their own type and cast in the graph.
+    """
+    conftest.config_reset()
+    image_path = str(tmp_path / 'image.tiff')
+    label_path = str(tmp_path / 'label.tiff')
+    image = (np.arange(64 * 32, dtype=np.uint16) * 30).reshape((64, 32, 1))
+    tiff.write_tiff(image_path, image)
+    tiff.write_tiff(label_path, (image[:, :, 0] % 2).astype(np.uint8))
+    d = imagery_dataset.ImageryDataset(ImageSet([image_path], 'tiff'), ImageSet([label_path], 'tiff'),
+                                       (32, 32), None, tile_shape=(32, 32))
+    ds = d.data()
+    assert ds.element_spec.dtype == tf.float32
+    assert d._image_types[0] == {np.dtype(np.uint16)} # pylint: disable=protected-access
+    tiles = [t.numpy() for t in ds]
+    assert len(tiles) == 2
+    assert tiles[0].dtype == np.float32
+    assert sum(np.sum(t, dtype=np.float64) for t in tiles) == np.sum(image, dtype=np.float64)
+
 def test_rectangle():
     """
     Tests the Rectangle class basics.
@@ -197,6 +234,38 @@ def test_rectangle_rois():
     tiles = r.make_tile_rois((7, 7), include_partials=False, containing_rect=c)[0]
     assert len(tiles) == 4
 
+def test_merge_disk_blocks():
+    """
+    Tests that rows of tiles sharing a row of disk blocks are read together.
+    """
+    r = rectangle.Rectangle(0, 0, 10, 40)
+    blocks = r.make_tile_rois((5, 5), include_partials=False, by_block=True)[0]
+    assert len(blocks) == 8
+
+    # blocks on disk no taller than a row of tiles, nothing to merge
+    merged = imagery_dataset.ImageryDataset._merge_disk_blocks(blocks, 5, 40) # pylint: disable=protected-access
+    assert len(merged) == 8
+
+    # two rows of tiles per block on disk
+    merged = imagery_dataset.ImageryDataset._merge_disk_blocks(blocks, 10, 40) # pylint: disable=protected-access
+    assert len(merged) == 4
+    for (i, (rect, tiles)) in enumerate(merged):
+        assert rect.bounds() == (0, 10, i * 10, i * 10 + 10)
+        assert len(tiles) == 4
+        assert [t.bounds() for t in tiles] == [(0, 5, 0, 5), (5, 10, 0, 5), (0, 5, 5, 10), (5, 10, 5, 10)]
+
+    # merged height is capped
+    merged = imagery_dataset.ImageryDataset._merge_disk_blocks(blocks, 40, 12) # pylint: disable=protected-access
+    assert len(merged) == 4
+    assert all(rect.height() == 10 for (rect, _) in merged)
+
+    # overlapping rows stop merging at each new row of disk blocks
+    blocks = r.make_tile_rois((6, 6), include_partials=False, overlap_shape=(2, 2), by_block=True)[0]
+    assert len(blocks) == 9
+    merged = imagery_dataset.ImageryDataset._merge_disk_blocks(blocks, 10, 40) # pylint: disable=protected-access
+    assert [rect.bounds()[2:] for (rect, _) in merged] == [(0, 10), (8, 18), (16, 30), (28, 38)]
+    assert sum(len(tiles) for (_, tiles) in merged) == sum(len(tiles) for (_, tiles) in blocks)
+
 @pytest.fixture(scope="function")
 def autoencoder(all_sources):
     source = all_sources[0]
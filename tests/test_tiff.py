@@ -23,7 +23,7 @@ import pytest
 import numpy as np
 
 from delta.imagery import rectangle
-from delta.extensions.sources.tiff import TiffImage, TiffWriter, write_tiff
+from delta.extensions.sources.tiff import TiffImage, TiffWriter, write_tiff, _READ_BAND_LIST
 
 def check_landsat_tiff(filename):
     '''
@@ -137,3 +137,24 @@ def test_geotiff_write(tmpdir):
 
     assert numpy_image.shape == data.shape
     assert np.allclose(numpy_image, data)
+
+@pytest.mark.skipif(not _READ_BAND_LIST, reason='band_list requires GDAL 3.5')
+def test_read_bands_multi_file(tmp_path):
+    """
+    Tests reading bands from several files at once, out of order.
+    """
+    data1 = np.arange(20 * 30 * 2, dtype=np.float32).reshape((20, 30, 2))
+    data2 = -np.arange(20 * 30 * 2, dtype=np.float32).reshape((20, 30, 2)) - 1
+    write_tiff(str(tmp_path / 'a.tiff'), data1)
+    write_tiff(str(tmp_path / 'b.tiff'), data2)
+    img = TiffImage([str(tmp_path / 'a.tiff'), str(tmp_path / 'b.tiff')])
+    assert img.num_bands() == 4
+    all_bands = np.concatenate((data1, data2), axis=2)
+
+    r = rectangle.Rectangle(3, 5, width=20, height=10)
+    for bands in ([2, 0, 3], [0, 1, 3], [3, 2, 1, 0]):
+        d = img.read(roi=r, bands=bands)
+        assert d.shape == (10, 20, len(bands))
+        for (i, b) in enumerate(bands):
+            assert np.array_equal(d[:, :, i], img.read(roi=r, bands=[b])[:, :, 0])
+            assert np.array_equal(d[:, :, i], all_bands[5:15, 3:23, b])
@@ -21,6 +21,7 @@ import shutil
 import tempfile
 
 import numpy as np
+import pytest
 import tensorflow as tf
 from tensorflow import keras
 import h5py
@@ -68,6 +69,28 @@ def test_dense(dataset):
         return keras.Model(inputs=kerasinput, outputs=reshape)
     evaluate_model(model_fn, dataset, 1)
 
+def test_cache_dataset(dataset, tmp_path):
+    def model_fn():
+        kerasinput = keras.layers.Input((3, 3, 1))
+        flat = keras.layers.Flatten()(kerasinput)
+        dense = keras.layers.Dense(2, activation=tf.nn.softmax)(flat)
+        reshape = keras.layers.Reshape((1, 1, 2))(dense)
+        return keras.Model(inputs=kerasinput, outputs=reshape)
+    cache_dir = str(tmp_path)
+    model, _ = train.train(model_fn, dataset,
+                           TrainingSpec(10, 2, 'sparse_categorical_crossentropy',
+                                        ['sparse_categorical_accuracy'],
+                                        cache_dataset=True, cache_dir=cache_dir))
+    assert model is not None
+    # the cache is removed when training finishes
+    assert not os.listdir(cache_dir)
+
+    with pytest.raises(ValueError):
+        train.train(model_fn, dataset,
+                    TrainingSpec(10, 2, 'sparse_categorical_crossentropy', ['sparse_categorical_accuracy'],
+                                 steps=5, max_tile_offset=2, cache_dataset=True, cache_dir=cache_dir))
+    assert not os.listdir(cache_dir)
+
 def test_pretrained(dataset, ae_dataset):
     # 1 create autoencoder
     ae_dataset.set_chunk_output_shapes((10, 10), (10, 10))